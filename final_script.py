@@ -2,11 +2,178 @@ import json
 import time
 import re
 import os
+from functools import lru_cache
 from pathlib import Path
-from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
+
+# orjson if available (serializes straight to bytes), otherwise the stdlib json module
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 OUTPUT_PATH = Path(__file__).parent / "product_table.json"
 STORAGE_STATE = Path(__file__).parent / "playwright_state.json"
+PROFILE_DIR = Path(__file__).parent / ".pw-profile"
+CHALLENGE_URL = "https://hiring.idenhq.com/challenge"
+
+def _dump_json(obj, path):
+    if orjson is not None:
+        path.write_bytes(orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+    else:
+        with path.open("w", encoding="utf-8") as fp:
+            json.dump(obj, fp, indent=2, ensure_ascii=False)
+
+
+def _load_json(path):
+    if orjson is not None:
+        return orjson.loads(path.read_bytes())
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+# Precompiled patterns (compiled once at import instead of on every call)
+_SKU_RE = re.compile(r"[A-Z]{2,4}-\d{3,}-\d+")
+# page header "Iden Challenge ... Product Inventory ... Showing N of N products", matched in
+# stages so each part is a single forward scan (no nested .*? backtracking)
+_HEADER_PARTS_RE = (
+    re.compile(r"Iden Challenge", re.I),
+    re.compile(r"Product Inventory", re.I),
+    re.compile(r"Showing\s*\d+\s*of\s*\d+\s*products", re.I),
+)
+_TABLE_HINT_RE = re.compile(r"Prod(uct)?|SKU|Name|Price", re.I)
+_BLOCK_HINT_RE = re.compile(r"SKU|Manufacturer|ID:|Updated", re.I)
+_POST_LOGIN_URL_RE = re.compile(r"challenge|dashboard")
+_SIGN_IN_RE = re.compile(r"^\s*Sign in\s*$", re.I)
+_PRODUCT_RESPONSE_RE = re.compile(r"product|inventory", re.I)
+_AUTH_COOKIE_RE = re.compile(r"session|auth", re.I)
+_PAG_NEXT_RE = re.compile(r"^\s*(Next|>|›|»|→)\s*$", re.I)
+_LOAD_NEXT_RE = re.compile(r"^\s*(Next|>|›|»|→|More|Load more)\s*$", re.I)
+_OF_TOTAL_RE = re.compile(r"of\s+([0-9,]{2,})", re.I)
+# raw API values, converted to the form the table displays
+_PLAIN_NUMBER_RE = re.compile(r"^-?\d+(\.\d+)?$")
+_ISO_DATE_RE = re.compile(r"^(\d{4})-(\d{2})-(\d{2})(?:[T ]|$)")
+
+# Card parsing vocabulary
+# "<label>: <value>" card line; group 1 is the output field, group 2 the (possibly empty) value
+_LABEL_RE = re.compile(r"^(id|shade|cost|manufacturer|sku|composition|updated)\s*:\s*(.*)$", re.I)
+_CATEGORIES = frozenset({
+    "beauty","automotive","toys","books","home & kitchen","garden","office",
+    "health","clothing","electronics","home","kitchen"
+})
+_HEADER_NOISE = frozenset({"iden challenge", "candidate", "instructions", "submit solution",
+                           "sign out", "product dashboard", "assessment id", "showing", "layout:"})
+_HEADER_NOISE_RE = re.compile("|".join(re.escape(h) for h in sorted(_HEADER_NOISE)), re.I)
+
+# Output field -> accepted (lowercase) table header names, in priority order
+_FIELD_ALIASES = (
+    ("product_name", ("product name", "name", "product", "title")),
+    ("type", ("type", "category")),
+    ("id", ("id",)),
+    ("shade", ("shade", "color")),
+    ("cost", ("cost", "price")),
+    ("manufacturer", ("manufacturer", "maker", "brand")),
+    ("sku", ("sku",)),
+    ("composition", ("composition", "material")),
+    ("updated", ("updated", "last updated", "modified")),
+)
+
+
+def _product_key(item):
+    # dedupe key shared by every extraction path: sku, else id (0 is a valid id),
+    # else name|type, which distinct products do share
+    if item["sku"]:
+        return item["sku"]
+    if item["id"] not in ("", None):
+        return f"id:{item['id']}"
+    return f"{item['product_name']}|{item['type']}"
+
+
+def _session_cookies_valid(cookies, margin=60):
+    # True only when there are auth/session cookies and none expires within `margin` seconds;
+    # browser-session cookies (expires -1) or no auth cookies at all are inconclusive
+    auth = [c for c in cookies if _AUTH_COOKIE_RE.search(c.get("name") or "")]
+    deadline = time.time() + margin
+    return bool(auth) and all((c.get("expires") or -1) > deadline for c in auth)
+
+
+def _is_product_response(response):
+    # JSON responses from what looks like the product/inventory endpoint
+    try:
+        return (
+            response.ok
+            and "json" in (response.headers.get("content-type") or "")
+            and bool(_PRODUCT_RESPONSE_RE.search(response.url))
+        )
+    except Exception:
+        return False
+
+
+def _is_count(value):
+    # a JSON integer; bool is an int subclass but true/false is no total
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _total_from_response(response):
+    # total product count advertised by a paginated API response, in a header or the payload
+    try:
+        header = response.headers.get("x-total-count")
+        if header and header.strip().isdigit():
+            return int(header)
+        payload = response.json()
+    except Exception:
+        return None
+    if isinstance(payload, dict):
+        for holder in (payload, payload.get("pagination"), payload.get("meta")):
+            if isinstance(holder, dict):
+                for key in ("total", "totalCount", "total_count"):
+                    if _is_count(holder.get(key)):
+                        return holder[key]
+        # many endpoints report this page's item count as "count": only a count larger
+        # than the records in this payload can be the overall total
+        page_size = len(_records_from_payload(payload))
+        for holder in (payload, payload.get("pagination"), payload.get("meta")):
+            if isinstance(holder, dict) and _is_count(holder.get("count")):
+                if holder["count"] > page_size:
+                    return holder["count"]
+    return None
+
+
+def _looks_like_product(item):
+    # a normalized record with real product signals: a sku, or an id and a name plus
+    # another product field (a bare name/title/id matches too much unrelated JSON)
+    if item["sku"]:
+        return True
+    others = ("type", "shade", "cost", "manufacturer", "composition")
+    return bool(item["id"] != "" and item["product_name"] and any(item[f] for f in others))
+
+
+def _records_from_payload(payload):
+    # list of record dicts, either the payload itself or under a common wrapper key
+    if isinstance(payload, list):
+        return [r for r in payload if isinstance(r, dict)]
+    if isinstance(payload, dict):
+        for key in ("products", "items", "data", "results", "rows"):
+            if key in payload:
+                records = _records_from_payload(payload[key])
+                if records:
+                    return records
+    return []
+
+
+def _header_end(blob):
+    # end offset of the leading page header, or None if it isn't there
+    pos = 0
+    for part in _HEADER_PARTS_RE:
+        m = part.search(blob, pos)
+        if not m:
+            return None
+        pos = m.end()
+    return pos
+
+
+@lru_cache(maxsize=64)
+def _text_pattern(text):
+    # case-insensitive literal matcher for a visible label, cached per label
+    return re.compile(re.escape(text), re.I)
 
 # Smart waiting helpers
 def wait_for_selector_visible(page, selector, timeout=5000):
@@ -23,21 +190,9 @@ def wait_for_locator_visible(locator, timeout=5000):
     except Exception:
         return False
 
-def wait_and_fill(page, selector, value, timeout=5000, pause=200):
-    try:
-        # accept either selector string or Locator
-        if isinstance(selector, str):
-            if not wait_for_selector_visible(page, selector, timeout=timeout):
-                return False
-            page.fill(selector, value, timeout=timeout)
-        else:
-            if not wait_for_locator_visible(selector, timeout=timeout):
-                return False
-            selector.fill(value, timeout=timeout)
-        page.wait_for_timeout(pause)
-        return True
-    except Exception:
-        return False
+def wait_for_text_visible(page, text, timeout=5000):
+    # wait until an element showing the given label is visible
+    return wait_for_locator_visible(page.get_by_text(_text_pattern(text)).first, timeout=timeout)
 
 def wait_and_click(page, target, timeout=5000, pause=300):
     try:
@@ -57,99 +212,160 @@ def wait_and_click(page, target, timeout=5000, pause=300):
         return False
 
 
-def try_fill(page, selectors, value, timeout=2000):
-    for sel in selectors:
-        try:
-            if wait_and_fill(page, sel, value, timeout=timeout):
-                return True
-        except Exception:
-            continue
-    return False
-
-
 def try_click_by_text(page, text, timeout=5000):
-    # try several strategies to click a visible button/link with given text
+    # click a visible button/link/element with given text, preferring that order;
+    # one combined wait of `timeout` ms instead of one per strategy
+    # fast path: an interactive element whose whole text is the label is checked without
+    # waiting (restricted to clickable roles so e.g. a "Sign in" heading never wins)
     try:
-        locator = page.get_by_role("button", name=re.compile(text, re.I))
-        if wait_for_locator_visible(locator, timeout=timeout):
-            locator.click(timeout=timeout)
+        exact = page.locator(
+            ':is(button, a, [role=button], [role=link], [role=tab]):text-is("{}")'.format(
+                text.replace("\\", "\\\\").replace('"', '\\"')
+            )
+        ).first
+        if exact.count() > 0 and exact.is_visible():
+            exact.click(timeout=1000)
             page.wait_for_timeout(300)
             return True
     except Exception:
         pass
+    pat = _text_pattern(text)
+    # buttons, then links, then any text: the union only serves the single wait,
+    # since its .first is whichever match comes first in the document
+    candidates = (
+        page.get_by_role("button", name=pat),
+        page.get_by_role("link", name=pat),
+        page.get_by_text(pat),
+    )
     try:
-        locator = page.get_by_text(re.compile(text, re.I)).first
-        if wait_for_locator_visible(locator, timeout=timeout):
-            locator.click(timeout=timeout)
-            page.wait_for_timeout(300)
-            return True
+        wait_for_locator_visible(
+            candidates[0].or_(candidates[1]).or_(candidates[2]).first, timeout=timeout
+        )
+        for candidate in candidates:
+            locator = candidate.first
+            if locator.count() > 0 and locator.is_visible():
+                locator.click(timeout=timeout)
+                page.wait_for_timeout(300)
+                return True
     except Exception:
         pass
-    # fallback: click any element that contains the text
+    return False
+
+
+def next_page_locator(page, load_more=False):
+    # Next button or link, or a pagination list item whose whole text is a Next marker;
+    # anchored patterns, so a cell like "Next-Gen ..." never matches. "More"/"Load more"
+    # (which a site-nav menu can also be named) only with load_more, for append-style
+    # loading. Building it costs no round trip and it re-resolves lazily as pages change
+    name = _LOAD_NEXT_RE if load_more else _PAG_NEXT_RE
+    return (
+        page.get_by_role("button", name=name)
+        .or_(page.get_by_role("link", name=name))
+        .or_(
+            page.locator("ul.pagination a, nav[aria-label*='pagination'] a, .pagination a")
+            .filter(has_text=_PAG_NEXT_RE)
+        )
+        .first
+    )
+
+
+def try_click_next(page, timeout=0, load_more=False):
+    # click the pagination control if it is (or becomes, within `timeout` ms) visible
+    # and is enabled; a disabled Next means the last page
+    locator = next_page_locator(page, load_more=load_more)
     try:
-        # use locator text= which supports Playwright's text selector
-        sel = f"text={text}"
-        if wait_for_selector_visible(page, sel, timeout=timeout):
-            page.click(sel, timeout=timeout)
-            page.wait_for_timeout(300)
+        visible = wait_for_locator_visible(locator, timeout=timeout) if timeout else locator.is_visible()
+        if visible and locator.is_enabled():
+            locator.click(timeout=1000)
             return True
     except Exception:
-        return False
+        pass
+    return False
+
 
-def ensure_all_rows_loaded(page, table_locator=None, row_selector="tbody tr", timeout_ms=120000, pause=0.6):
+def ensure_all_rows_loaded(page, table_locator=None, row_selector="tbody tr", timeout_ms=120000, pause=0.6,
+                           expected_total=None):
     start = time.time()
     last_count = -1
     stable = 0
     max_stable = 3
 
     def count_rows():
+        # one evaluate per pass; the table locator re-resolves each time, so a table
+        # the page re-rendered is counted afresh instead of a detached old element
         try:
             if table_locator:
-                return table_locator.locator(row_selector).count()
-            return page.locator(row_selector).count()
+                return table_locator.evaluate("(t, sel) => t.querySelectorAll(sel).length", row_selector)
+            return page.evaluate("sel => document.querySelectorAll(sel).length", row_selector)
         except Exception:
             return 0
 
-    # try to detect expected total like "Showing 1-20 of 2850"
-    expected_total = None
-    try:
-        body = page.inner_text("body", timeout=2000)
-        m = re.search(r"of\s+([0-9,]{2,})", body, re.I)
-        if m:
-            expected_total = int(m.group(1).replace(",", ""))
-    except Exception:
-        expected_total = None
+    # no total from the API: detect one like "Showing 1-20 of 2850" in the page,
+    # returning just the number instead of transferring the whole body text
+    if expected_total is None:
+        try:
+            found = page.evaluate(
+                """src => {
+                    const m = new RegExp(src, 'i').exec(document.body.innerText);
+                    return m ? m[1] : null;
+                }""",
+                _OF_TOTAL_RE.pattern,
+            )
+            if found:
+                expected_total = int(found.replace(",", ""))
+        except Exception:
+            expected_total = None
+
+    wait_token = [0]
+
+    def wait_for_rows(prev, wait_ms):
+        # poll in the page (every 100 ms) until the row count moved off `prev` and held
+        # for two polls, or the expected total is reached; returns early instead of
+        # sleeping a fixed pause. A timeout just means no new rows arrived.
+        wait_token[0] += 1
+        try:
+            # resolved per wait: a handle kept across passes would go stale on re-render
+            root = table_locator.element_handle(timeout=1000) if table_locator else None
+        except Exception:
+            root = None
+        result = None
+        try:
+            result = page.wait_for_function(
+                """(a) => {
+                    // table replaced by a re-render: stop, the caller recounts on the new one
+                    if (a.root && !a.root.isConnected) return true;
+                    const n = (a.root || document).querySelectorAll(a.sel).length;
+                    if (a.expected && n >= a.expected) return true;
+                    const st = window.__rowWait;
+                    if (!st || st.token !== a.token) {
+                        window.__rowWait = {token: a.token, last: n, stable: 0};
+                        return false;
+                    }
+                    if (n === st.last) { st.stable++; } else { st.stable = 0; st.last = n; }
+                    return n !== a.prev && st.stable >= 2;
+                }""",
+                arg={"root": root, "sel": row_selector, "expected": expected_total,
+                     "prev": prev, "token": wait_token[0]},
+                polling=100,
+                timeout=wait_ms,
+            )
+        except Exception:
+            pass
+        finally:
+            # release the per-wait handles so a long loop doesn't pile them up in the page
+            for handle in (result, root):
+                if handle is not None:
+                    try:
+                        handle.dispose()
+                    except Exception:
+                        pass
 
     while (time.time() - start) * 1000 < timeout_ms:
         curr = count_rows()
-        # try pagination clicks first
-        clicked = False
-        for txt in ["Next", "next", ">", "»", "→", "More", "Load more"]:
-            try:
-                if try_click_by_text(page, txt, timeout=800):
-                    clicked = True
-                    page.wait_for_load_state("networkidle", timeout=3000)
-                    page.wait_for_timeout(int(pause * 1000))
-                    break
-            except Exception:
-                continue
-
-        if not clicked:
-            # try to click pagination anchors if present
-            try:
-                # common pagination list items
-                pag_links = page.locator("ul.pagination a, nav[aria-label*='pagination'] a, .pagination a")
-                for i in range(pag_links.count()):
-                    a = pag_links.nth(i)
-                    txt = a.inner_text().strip()
-                    if re.match(r"^\s*(Next|>|»|→)\s*$", txt, re.I):
-                        a.click(timeout=1000)
-                        clicked = True
-                        page.wait_for_load_state("networkidle", timeout=3000)
-                        page.wait_for_timeout(int(pause * 1000))
-                        break
-            except Exception:
-                pass
+        # try pagination clicks first; a disabled Next (last page) falls through to scrolling
+        clicked = try_click_next(page, load_more=True)
+        if clicked:
+            wait_for_rows(curr, 3000)
 
         if not clicked:
             # scroll the table container if provided
@@ -164,7 +380,7 @@ def ensure_all_rows_loaded(page, table_locator=None, row_selector="tbody tr", ti
                     page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
             except Exception:
                 pass
-            page.wait_for_timeout(int(pause * 1000))
+            wait_for_rows(curr, int(pause * 1000))
 
         new_count = count_rows()
         # if expected_total known and reached, finish
@@ -184,98 +400,275 @@ def ensure_all_rows_loaded(page, table_locator=None, row_selector="tbody tr", ti
 
 def extract_table_to_list(table_locator):
     # table_locator is a playwright Locator for a <table>
-    headers = []
-    try:
-        headers = table_locator.locator("thead tr th").all_text_contents()
-    except Exception:
-        headers = []
-    if not headers:
-        # try first row as header
-        first_row_th = table_locator.locator("tr").first.locator("th")
-        if first_row_th.count() > 0:
-            headers = first_row_th.all_text_contents()
+    # read headers and every cell in one browser round-trip instead of per-row/per-cell calls
+    data = table_locator.evaluate(
+        """tbl => {
+            let hdr = [...tbl.querySelectorAll('thead tr th')].map(e => e.textContent.trim());
+            const firstRow = tbl.querySelector('tr');
+            if (!hdr.length && firstRow) {
+                // try first row as header
+                hdr = [...firstRow.querySelectorAll('th')].map(e => e.textContent.trim());
+            }
+            let trs = [...tbl.querySelectorAll('tbody tr')];
+            if (!trs.length) {
+                // fallback to any tr after thead
+                trs = [...tbl.querySelectorAll('tr')].slice(1);
+            }
+            const rows = trs.map(tr => [...tr.querySelectorAll('td')].map(td => td.textContent.trim()));
+            return {hdr, rows};
+        }"""
+    )
+    # headers arrive trimmed; extend them with generic colN names once, not per cell
+    headers = list(data["hdr"])
     rows = []
-    body_rows = table_locator.locator("tbody tr")
-    if body_rows.count() == 0:
-        # fallback to any tr after thead
-        # build list from all tr except thead
-        all_tr = table_locator.locator("tr")
-        for i in range(1, all_tr.count()):
-            row = all_tr.nth(i)
-            cells = row.locator("td").all_text_contents()
-            if not headers:
-                headers = [f"col{j}" for j in range(len(cells))]
-            item = {headers[j].strip() if j < len(headers) else f"col{j}": cells[j].strip() for j in range(len(cells))}
-            rows.append(item)
-        return rows
-    for i in range(body_rows.count()):
-        row = body_rows.nth(i)
-        cells = row.locator("td").all_text_contents()
-        if not headers:
-            # create generic headers
-            headers = [f"col{j}" for j in range(len(cells))]
-        item = {headers[j].strip() if j < len(headers) else f"col{j}": cells[j].strip() for j in range(len(cells))}
-        rows.append(item)
+    for cells in data["rows"]:
+        if len(cells) > len(headers):
+            headers.extend(f"col{j}" for j in range(len(headers), len(cells)))
+        rows.append(dict(zip(headers, cells)))
     return rows
 
 
-def parse_products_from_text(blob):
+def build_normalizer(headers):
     """
-    Parse product cards/text blob and return list of product dicts with keys:
-    product_name, type, id, shade, cost, manufacturer, sku, composition, updated
+    Return a function normalizing rows that share these headers. The header ->
+    field mapping (same aliases as normalize_row_dict) is resolved once, so each
+    row is plain dict lookups. Values come back as stripped strings ("" when
+    missing or null), with a numeric id cast to int. A plain-number cost and an
+    ISO updated date are written the way the table shows them ("$932.50",
+    "8/7/2025"), so the output doesn't depend on which path produced it.
     """
-    products = []
-    # 1) Try to find structured blocks using regex (cards with labels)
-    pattern = re.compile(
-        r"(?P<name>.+?)\n(?P<type>.+?)\n\s*\nID:\s*(?P<id>\d+)\s*\n\s*Shade:\s*\n(?P<shade>.+?)\s*\nCost:\s*\n(?P<cost>\$[\d,\.]+)\s*\nManufacturer:\s*\n(?P<manufacturer>.+?)\s*\nSKU:\s*\n(?P<sku>.+?)\s*\nComposition:\s*\n(?P<composition>.+?)\s*\nUpdated:\s*(?P<updated>[\d/]+)",
-        re.IGNORECASE | re.DOTALL,
+    mapping = _field_mapping(tuple(headers))
+
+    def normalize(row):
+        out = {}
+        for field, h in mapping.items():
+            v = row.get(h) if h is not None else None
+            out[field] = "" if v is None else str(v).strip()
+        if _PLAIN_NUMBER_RE.match(out["cost"]):
+            out["cost"] = "${:,.2f}".format(float(out["cost"]))
+        m = _ISO_DATE_RE.match(out["updated"])
+        if m:
+            out["updated"] = "{}/{}/{}".format(int(m.group(2)), int(m.group(3)), m.group(1))
+        if out["id"].isdigit():
+            out["id"] = int(out["id"])
+        return out
+
+    return normalize
+
+
+def table_product_columns(table_locator):
+    """
+    Column index (or -1) of each output field in a <table> Locator, resolved from
+    its headers with the same aliases as normalize_row_dict.
+    """
+    headers = table_locator.evaluate(
+        """tbl => {
+            let hdr = [...tbl.querySelectorAll('thead tr th')].map(e => e.textContent.trim());
+            const firstRow = tbl.querySelector('tr');
+            if (!hdr.length && firstRow) {
+                hdr = [...firstRow.querySelectorAll('th')].map(e => e.textContent.trim());
+            }
+            return hdr;
+        }"""
+    )
+    # resolve header -> column index once for the whole table; a dict keyed by
+    # header keeps the last column for repeated headers, like a raw row dict
+    cols = _match_fields({h: j for j, h in enumerate(headers)}, default=-1)
+    return [cols[field] for field, _ in _FIELD_ALIASES]
+
+
+def extract_products_from_table(table_locator, columns=None):
+    """
+    Extract normalized product dicts (same shape as normalize_row_dict) from a
+    <table> Locator, reading only the columns that map to an output field.
+    Pass `columns` from table_product_columns() to skip re-reading the headers
+    when extracting several pages of the same table.
+    """
+    if columns is None:
+        columns = table_product_columns(table_locator)
+    fields = [field for field, _ in _FIELD_ALIASES]
+    # all rows in one round-trip, projected to the output columns in the page
+    rows = table_locator.evaluate(
+        """(tbl, cols) => {
+            let trs = [...tbl.querySelectorAll('tbody tr')];
+            if (!trs.length) {
+                trs = [...tbl.querySelectorAll('tr')].slice(1);
+            }
+            return trs.map(tr => {
+                const cells = tr.querySelectorAll('td');
+                return cols.map(j => (j >= 0 && j < cells.length) ? cells[j].textContent.trim() : '');
+            });
+        }""",
+        columns,
     )
-    for m in pattern.finditer(blob):
-        d = m.groupdict()
-        item = {
-            "product_name": d.get("name", "").strip(),
-            "type": d.get("type", "").strip(),
-            "id": int(d.get("id")) if d.get("id") and d.get("id").isdigit() else d.get("id", "").strip(),
-            "shade": d.get("shade", "").strip(),
-            "cost": d.get("cost", "").strip(),
-            "manufacturer": d.get("manufacturer", "").strip(),
-            "sku": d.get("sku", "").strip(),
-            "composition": d.get("composition", "").strip(),
-            "updated": d.get("updated", "").strip(),
-        }
+    products = []
+    for cells in rows:
+        item = dict(zip(fields, cells))
+        if item["id"].isdigit():
+            item["id"] = int(item["id"])
         products.append(item)
+    return products
+
 
-    if products:
-        # dedupe and return
-        seen = set()
-        dedup = []
-        for p in products:
-            key = str(p.get("sku") or p.get("id") or (p.get("product_name")+"|"+p.get("type")))
-            if key in seen:
+def collect_products_from_responses(page, responses):
+    """
+    Normalize the product records found in captured JSON responses (filled by a
+    page "response" listener), clicking "Next" for further pages while each new
+    response adds products (scrolling instead, for infinite-scroll / load-more
+    UIs, while the advertised total isn't reached). Only the endpoint yielding
+    the most product-like records is trusted. Returns (products, total), total
+    being what that endpoint advertised (or None); ([], None) when no product
+    payload was seen.
+    """
+    # products per endpoint (URL without the query, so its pages group together)
+    # so unrelated JSON can't mix into the result
+    groups = {}
+    totals = {}
+    # records of one endpoint share their keys: resolve the mapping once per key set
+    normalizers = {}
+    done = 0
+    while True:
+        added = 0
+        for response in responses[done:]:
+            try:
+                payload = response.json()
+                endpoint = response.url.split("?", 1)[0]
+            except Exception:
                 continue
-            seen.add(key)
-            dedup.append(p)
-        return dedup
-
-    # 2) Fallback: parse card-style lists by scanning lines for patterns like:
-    #    <Product Name>
-    #    <Category/Type>
-    #    ...other label/value lines...
-    categories = {
-        "beauty","automotive","toys","books","home & kitchen","garden","office",
-        "health","clothing","electronics","garden","home","kitchen"
-    }
-    header_noise = ["iden challenge", "candidate", "instructions", "submit solution",
-                    "sign out", "product dashboard", "assessment id", "showing", "layout:"]
-    lines = [ln.strip() for ln in blob.splitlines() if ln.strip()]
+            accepted = False
+            for record in _records_from_payload(payload):
+                keys = tuple(record)
+                normalize = normalizers.get(keys)
+                if normalize is None:
+                    normalize = normalizers[keys] = build_normalizer(keys)
+                item = normalize(record)
+                if not _looks_like_product(item):
+                    continue
+                accepted = True
+                products = groups.setdefault(endpoint, {})
+                key = _product_key(item)
+                if key not in products:
+                    products[key] = item
+                    added += 1
+            if accepted and totals.get(endpoint) is None:
+                totals[endpoint] = _total_from_response(response)
+        done = len(responses)
+        if not added:
+            break
+        if not try_click_next(page, timeout=800):
+            best = max(groups, key=lambda e: len(groups[e]))
+            if not totals.get(best) or len(groups[best]) >= totals[best]:
+                break
+            # no Next control but rows missing: scroll to trigger the next fetch
+            try:
+                page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
+            except Exception:
+                break
+        # wait (bounded) for the next page's response to be captured
+        deadline = time.time() + 3
+        while len(responses) == done and time.time() < deadline:
+            page.wait_for_timeout(100)
+    if not groups:
+        return [], None
+    best = max(groups, key=lambda e: len(groups[e]))
+    return list(groups[best].values()), totals.get(best)
+
+
+def paginate_and_collect(page, table_locator, max_pages=None, expected_total=None):
+    """
+    Walk the table page by page (clicking "Next") and return the normalized rows
+    of every page, deduped by sku (else id, else name|type). Stops when "Next"
+    can't be clicked, a page adds no new rows, max_pages is reached, or
+    expected_total rows have been collected.
+    """
+    first_row_js = "t => (t.querySelector('tbody tr') || {}).textContent || ''"
+    # headers don't change between pages: resolve the columns once
+    columns = table_product_columns(table_locator)
+    products = {}
+    pages = 0
+    while True:
+        added = 0
+        for item in extract_products_from_table(table_locator, columns):
+            key = _product_key(item)
+            if key not in products:
+                products[key] = item
+                added += 1
+        pages += 1
+        if not added or (max_pages is not None and pages >= max_pages):
+            break
+        # every advertised row is in: skip the click and row wait on the last page
+        if expected_total and len(products) >= expected_total:
+            break
+        first_row = table_locator.evaluate(first_row_js)
+        if not try_click_next(page, timeout=800):
+            break
+        # wait (bounded) for the next page's rows to replace the current ones
+        deadline = time.time() + 3
+        while time.time() < deadline:
+            if table_locator.evaluate(first_row_js) != first_row:
+                break
+            page.wait_for_timeout(100)
+    return list(products.values())
+
+
+def _parse_cards(lines):
+    """
+    Single pass over stripped, non-empty lines of a card-style blob:
+        <Product Name>
+        <Category/Type>
+        ID: <id>
+        Shade:
+        <shade>
+        ...other label/value lines...
+    A card starts at a name/type pair (type is a known category, or the pair
+    is followed by an ID: line) and runs until the next card or EOF.
+    Cards repeated in the blob (same sku, else id, else name|type) are kept once.
+    """
+    # keyed by _product_key: dedupe as each card completes (first one wins)
+    products = {}
+
+    def flush(card):
+        products.setdefault(_product_key(card), card)
+
+    current = None
+    n = len(lines)
+    # classify every line once up front; the loop looks ahead by up to three lines
+    # (lines without a colon can't be labels, so skip the regex for them)
+    labels = [_LABEL_RE.match(ln) if ":" in ln else None for ln in lines] + [None, None, None]
+
+    def starts_card(j):
+        # lines[j] is a name followed by its type: a known category (and the name isn't
+        # page chrome), or the pair is followed by an ID: line
+        if labels[j] or j + 1 >= n or labels[j + 1]:
+            return False
+        next_label = labels[j + 2]
+        return (
+            lines[j + 1].lower() in _CATEGORIES and not _HEADER_NOISE_RE.search(lines[j])
+        ) or (next_label is not None and next_label.group(1).lower() == "id")
+
     i = 0
-    while i < len(lines) - 1:
-        name = lines[i]
-        typ = lines[i + 1]
-        if typ.lower() in categories and not any(h in name.lower() for h in header_noise):
-            prod = {
-                "product_name": name,
-                "type": typ,
+    while i < n:
+        line = lines[i]
+        m = labels[i]
+        if m:
+            if current is not None:
+                # lines are pre-stripped, so the value needs no further strip
+                field, val = m.groups()
+                field = field.lower()
+                # value may sit on the line after the label ("Shade:\nGold"), unless
+                # that line is the next card's name (an empty last field)
+                if not val and i + 1 < n and not labels[i + 1] and not starts_card(i + 1):
+                    i += 1
+                    val = lines[i]
+                current[field] = int(val) if field == "id" and val.isdigit() else val
+            i += 1
+            continue
+        if starts_card(i):
+            if current is not None:
+                flush(current)
+            current = {
+                "product_name": line,
+                "type": lines[i + 1],
                 "id": "",
                 "shade": "",
                 "cost": "",
@@ -284,53 +677,65 @@ def parse_products_from_text(blob):
                 "composition": "",
                 "updated": "",
             }
-            # scan next few lines to pick up labeled fields
-            j = i + 2
-            while j < len(lines) and j < i + 12:
-                l = lines[j]
-                low = l.lower()
-                if low.startswith("id:"):
-                    val = l.split(":", 1)[1].strip()
-                    prod["id"] = int(val) if val.isdigit() else val
-                elif low.startswith("shade"):
-                    prod["shade"] = l.split(":", 1)[1].strip() if ":" in l else (lines[j+1] if j+1 < len(lines) else "")
-                elif low.startswith("cost"):
-                    prod["cost"] = l.split(":", 1)[1].strip() if ":" in l else (lines[j+1] if j+1 < len(lines) else "")
-                elif low.startswith("manufacturer"):
-                    prod["manufacturer"] = l.split(":", 1)[1].strip() if ":" in l else (lines[j+1] if j+1 < len(lines) else "")
-                elif low.startswith("sku"):
-                    prod["sku"] = l.split(":", 1)[1].strip() if ":" in l else (lines[j+1] if j+1 < len(lines) else "")
-                elif low.startswith("composition"):
-                    prod["composition"] = l.split(":", 1)[1].strip() if ":" in l else (lines[j+1] if j+1 < len(lines) else "")
-                elif low.startswith("updated"):
-                    prod["updated"] = l.split(":", 1)[1].strip() if ":" in l else (lines[j+1] if j+1 < len(lines) else "")
-                else:
-                    # detect cost like "$123.45"
-                    if "$" in l and not prod["cost"]:
-                        prod["cost"] = l
-                    # detect SKU pattern e.g., ABC-1234-1
-                    if re.search(r"[A-Z]{2,4}-\d{3,}-\d+", l) and not prod["sku"]:
-                        prod["sku"] = l
-                j += 1
-            products.append(prod)
-            i = j
+            i += 2
+            continue
+        if current is not None:
+            # unlabeled values: cost like "$123.45", SKU like ABC-1234-1
+            if "$" in line and not current["cost"]:
+                current["cost"] = line
+            if _SKU_RE.search(line) and not current["sku"]:
+                current["sku"] = line
+        i += 1
+    if current is not None:
+        flush(current)
+    return list(products.values())
+
+
+def parse_products_from_text(blob):
+    """
+    Parse product cards/text blob and return list of product dicts with keys:
+    product_name, type, id, shade, cost, manufacturer, sku, composition, updated
+    """
+    lines = [s for s in (ln.strip() for ln in blob.splitlines()) if s]
+    return _parse_cards(lines)
+
+
+def _match_fields(raw, default=""):
+    """
+    Pick the value for each output field from a header-keyed dict using
+    _FIELD_ALIASES (exact header match first, then headers containing an alias).
+    """
+    # normalize header names once per row (first occurrence wins)
+    norm = {}
+    for k, v in raw.items():
+        if k:
+            norm.setdefault(k.strip().lower(), v)
+
+    out = {}
+    for field, candidates in _FIELD_ALIASES:
+        val = default
+        # exact header match first
+        for c in candidates:
+            if c in norm:
+                val = norm[c]
+                break
         else:
-            i += 1
+            # fallback: headers that contain the candidate
+            for c in candidates:
+                val = next((v for k, v in norm.items() if c in k), None)
+                if val is not None:
+                    break
+            else:
+                val = default
+        out[field] = val
+    return out
 
-    # final dedupe
-    seen = set()
-    dedup = []
-    for p in products:
-        key = p.get("sku") or f"{p.get('product_name')}|{p.get('type')}"
-        if key in seen:
-            continue
-        seen.add(key)
-        # ensure strings trimmed
-        for k in p:
-            if isinstance(p[k], str):
-                p[k] = p[k].strip()
-        dedup.append(p)
-    return dedup
+
+@lru_cache(maxsize=64)
+def _field_mapping(headers):
+    # output field -> source header (or None) for a tuple of header names; rows
+    # of one table/endpoint share their headers, so this is resolved once per set
+    return _match_fields({h: h for h in headers}, default=None)
 
 
 def normalize_row_dict(raw):
@@ -338,41 +743,8 @@ def normalize_row_dict(raw):
     Map a raw table/dict row to the required output keys.
     Accepts different header names and returns normalized dict.
     """
-    out = {
-        "product_name": "",
-        "type": "",
-        "id": "",
-        "shade": "",
-        "cost": "",
-        "manufacturer": "",
-        "sku": "",
-        "composition": "",
-        "updated": "",
-    }
-
-    # helper to fetch by multiple possible keys
-    def get_any(d, candidates):
-        for c in candidates:
-            for k in d.keys():
-                if k and k.strip().lower() == c.lower():
-                    return d[k]
-        # fallback: search keys that contain candidate
-        for c in candidates:
-            for k in d.keys():
-                if c.lower() in k.strip().lower():
-                    return d[k]
-        return ""
-
-    out["product_name"] = get_any(raw, ["product name", "name", "product", "title"])
-    out["type"] = get_any(raw, ["type", "category"])
-    out_id = get_any(raw, ["id", "ID"])
-    out["id"] = int(out_id) if str(out_id).isdigit() else (out_id or "")
-    out["shade"] = get_any(raw, ["shade", "color"])
-    out["cost"] = get_any(raw, ["cost", "price"])
-    out["manufacturer"] = get_any(raw, ["manufacturer", "maker", "brand"])
-    out["sku"] = get_any(raw, ["sku", "SKU"])
-    out["composition"] = get_any(raw, ["composition", "material"])
-    out["updated"] = get_any(raw, ["updated", "last updated", "modified"])
+    out = {field: ("" if h is None else raw[h]) for field, h in _field_mapping(tuple(raw)).items()}
+    out["id"] = int(out["id"]) if str(out["id"]).isdigit() else (out["id"] or "")
     # strip strings
     for k in out:
         if isinstance(out[k], str):
@@ -380,304 +752,367 @@ def normalize_row_dict(raw):
     return out
 
 
-# Load .env into environment (uses python-dotenv if available, otherwise a simple fallback)
-try:
-    from dotenv import load_dotenv
-    load_dotenv(dotenv_path=Path(__file__).parent / ".env", override=False)
-except Exception:
-    env_path = Path(__file__).parent / ".env"
-    if env_path.exists():
-        for line in env_path.read_text().splitlines():
-            line = line.strip()
-            if not line or line.startswith("#"):
+def _sign_in_present(page):
+    # sign-in indicators (the "Sign in" text, a password input or a login form),
+    # checked in one combined query
+    sign_in = (
+        page.get_by_text(_SIGN_IN_RE)
+        .or_(page.locator('input[type="password"], form[action*="login"]'))
+    )
+    return sign_in.count() > 0
+
+
+def perform_login(context, page, iden_url, username, password):
+    """
+    Log in through the form at iden_url with the given credentials and save the
+    storage state for future runs. Closes the context and raises if credentials
+    are missing or the inputs can't be found.
+    """
+    # Only require credentials when performing login
+    if not username or not password:
+        context.close()
+        raise RuntimeError("Missing IDEN_USERNAME or IDEN_PASSWORD in .env or environment required for login")
+
+    # 1) Go to login page
+    page.goto(iden_url, wait_until="domcontentloaded", timeout=60000)
+    wait_for_selector_visible(page, 'input[type="password"]', timeout=10000)
+
+    # 2) Fill credentials (from .env / env)
+    user_selectors = [
+        'input[name="username"]', 'input[name="email"]', 'input[type="email"]',
+        'input[id*=user]', 'input[placeholder*=User]', 'input[placeholder*=Email]'
+    ]
+    pass_selectors = [
+        'input[name="password"]', 'input[type="password"]', 'input[id*=pass]',
+        'input[placeholder*=Password]'
+    ]
+
+    # fill both fields in one round-trip instead of probing each selector with a wait
+    try:
+        filled_user, filled_pass = page.evaluate(
+            """([userSel, passSel, u, p]) => {
+                const setValue = (el, v) => {
+                    if (!el) return false;
+                    // use the native setter so framework-controlled inputs see the change
+                    Object.getOwnPropertyDescriptor(HTMLInputElement.prototype, 'value').set.call(el, v);
+                    el.dispatchEvent(new Event('input', {bubbles: true}));
+                    el.dispatchEvent(new Event('change', {bubbles: true}));
+                    return true;
+                };
+                // first visible match, trying the selectors in priority order
+                const pick = (sels) => {
+                    for (const sel of sels) {
+                        for (const el of document.querySelectorAll(sel)) {
+                            if (el.offsetParent) return el;
+                        }
+                    }
+                    return null;
+                };
+                return [setValue(pick(userSel), u), setValue(pick(passSel), p)];
+            }""",
+            [user_selectors, pass_selectors, username, password],
+        )
+    except Exception:
+        filled_user = filled_pass = False
+
+    if not filled_user or not filled_pass:
+        # try generic filling by finding first two inputs
+        try:
+            inputs = page.locator("input").all()
+            if len(inputs) >= 2:
+                inputs[0].fill(username)
+                inputs[1].fill(password)
+            else:
+                raise RuntimeError("Could not find credential inputs")
+        except Exception:
+            context.close()
+            raise
+
+    # submit - try many ways
+    submitted = False
+    try:
+        # try pressing Enter on password field
+        for sel in pass_selectors:
+            try:
+                page.press(sel, "Enter", timeout=2000)
+                submitted = True
+                break
+            except Exception:
                 continue
-            if "=" in line:
-                k, v = line.split("=", 1)
-                v = v.strip().strip('"').strip("'")
-                os.environ.setdefault(k.strip(), v)
+    except Exception:
+        pass
+
+    if not submitted:
+        # try clicking common submit buttons
+        for btn_text in ["Sign in", "Sign In", "Log in", "Login", "Submit"]:
+            if try_click_by_text(page, btn_text, timeout=3000):
+                submitted = True
+                break
+    # wait for login to complete (redirect away from the sign-in page)
+    try:
+        page.wait_for_url(_POST_LOGIN_URL_RE, timeout=15000)
+    except Exception:
+        pass
+
+    # After successful login (the redirect wait above), save storage state for future runs
+    try:
+        context.storage_state(path=str(STORAGE_STATE))
+    except Exception:
+        # non-fatal: continue without persisting
+        pass
+
+
+@lru_cache(maxsize=1)
+def _load_env():
+    """
+    Load .env into the environment once per process (python-dotenv if available,
+    otherwise a simple fallback). Existing environment variables win.
+    """
+    env_path = Path(__file__).parent / ".env"
+    try:
+        from dotenv import load_dotenv
+        load_dotenv(dotenv_path=env_path, override=False)
+    except Exception:
+        if env_path.exists():
+            for line in env_path.read_text().splitlines():
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                if "=" in line:
+                    k, v = line.split("=", 1)
+                    v = v.strip().strip('"').strip("'")
+                    os.environ.setdefault(k.strip(), v)
+
 
 def run():
+    # imported here so the parsing/normalizing helpers can be imported without loading the driver
+    from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
+
     with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)  # run in background/headless
+        # persistent profile keeps cookies/cache on disk between runs (run in background/headless)
+        context = p.chromium.launch_persistent_context(
+            user_data_dir=str(PROFILE_DIR),
+            headless=True,
+            args=["--disable-dev-shm-usage"],
+            bypass_csp=True,
+        )
+        page = context.pages[0] if context.pages else context.new_page()
 
         # read credentials and url from environment (.env)
+        _load_env()
         iden_url = os.getenv("IDEN_URL") or os.getenv("URL")
         username = os.getenv("IDEN_USERNAME") or os.getenv("IDEN_USER") or os.getenv("USER")
         password = os.getenv("IDEN_PASSWORD") or os.getenv("PASSWORD")
 
         if not iden_url:
-            browser.close()
+            context.close()
             raise RuntimeError("Missing IDEN_URL or URL in .env or environment")
 
-        context = None
-        page = None
-
-        # Try to reuse existing stored session
+        # Seed cookies from the stored session (a persistent context can't take storage_state)
         try:
             if STORAGE_STATE.exists():
-                try:
-                    context = browser.new_context(storage_state=str(STORAGE_STATE))
-                    page = context.new_page()
-                    # quick check if session is still valid by visiting the target page
-                    page.goto(iden_url, timeout=60000)
-                    page.wait_for_load_state("networkidle", timeout=10000)
-                    # Heuristic: if there's a visible sign-in form, consider session invalid
-                    try:
-                        sign_in_present = False
-                        # common sign-in indicators
-                        for sel in ['text="Sign in"', 'text="Sign In"', 'input[type="password"]', 'form[action*="login"]']:
-                            try:
-                                if page.locator(sel).count() > 0:
-                                    sign_in_present = True
-                                    break
-                            except Exception:
-                                continue
-                        if sign_in_present:
-                            context.close()
-                            context = None
-                            page = None
-                    except Exception:
-                        # If any check fails, fall back to fresh login
-                        if context:
-                            try:
-                                context.close()
-                            except Exception:
-                                pass
-                        context = None
-                        page = None
-                except Exception:
-                    # unable to create context with stored state, continue to fresh login
-                    if context:
-                        try:
-                            context.close()
-                        except Exception:
-                            pass
-                    context = None
-                    page = None
+                cookies = _load_json(STORAGE_STATE).get("cookies", [])
+                if cookies:
+                    context.add_cookies(cookies)
         except Exception:
-            context = None
-            page = None
-
-        # If we didn't get a valid context from storage, perform login and save storage
-        if context is None:
-            context = browser.new_context()
-            page = context.new_page()
-
-            # Only require credentials when performing login
-            if not username or not password:
-                context.close()
-                browser.close()
-                raise RuntimeError("Missing IDEN_USERNAME or IDEN_PASSWORD in .env or environment required for login")
-
-            # 1) Go to login page
-            page.goto(iden_url, timeout=60000)
-
-            # 2) Fill credentials (from .env / env)
-            user_selectors = [
-                'input[name="username"]', 'input[name="email"]', 'input[type="email"]',
-                'input[id*=user]', 'input[placeholder*=User]', 'input[placeholder*=Email]'
-            ]
-            pass_selectors = [
-                'input[name="password"]', 'input[type="password"]', 'input[id*=pass]',
-                'input[placeholder*=Password]'
-            ]
-
-            filled_user = try_fill(page, user_selectors, username)
-            filled_pass = try_fill(page, pass_selectors, password)
-
-            if not filled_user or not filled_pass:
-                # try generic filling by finding first two inputs
-                try:
-                    inputs = page.locator("input").all()
-                    if len(inputs) >= 2:
-                        inputs[0].fill(username)
-                        inputs[1].fill(password)
-                    else:
-                        raise RuntimeError("Could not find credential inputs")
-                except Exception:
-                    context.close()
-                    browser.close()
-                    raise
-
-            # submit - try many ways
-            submitted = False
-            try:
-                # try pressing Enter on password field
-                for sel in pass_selectors:
-                    try:
-                        page.press(sel, "Enter", timeout=2000)
-                        submitted = True
-                        break
-                    except Exception:
-                        continue
-            except Exception:
-                pass
+            pass
 
-            if not submitted:
-                # try clicking common submit buttons
-                for btn_text in ["Sign in", "Sign In", "Log in", "Login", "Submit"]:
-                    if try_click_by_text(page, btn_text, timeout=3000):
-                        submitted = True
-                        break
-            # wait a bit for login to complete
-            time.sleep(2)
+        # Unexpired auth cookies: reuse the session without a probe navigation
+        try:
+            logged_in = _session_cookies_valid(context.cookies())
+        except Exception:
+            logged_in = False
 
-            # After successful login, save storage state for future runs
+        # Otherwise check whether the session is still valid by visiting the target page
+        if not logged_in:
             try:
-                # navigate to a stable page/state before saving storage
-                try:
-                    page.wait_for_load_state("networkidle", timeout=5000)
-                except Exception:
-                    pass
-                context.storage_state(path=str(STORAGE_STATE))
+                # "commit" returns once the response starts; the waits below cover rendering
+                page.goto(iden_url, wait_until="commit", timeout=60000)
+                if page.url.startswith(CHALLENGE_URL):
+                    # already redirected into the challenge: skip login
+                    logged_in = True
+                else:
+                    # wait for either the login form or the app's Tools control, whichever renders
+                    wait_for_locator_visible(
+                        page.locator('input[type="password"]').or_(page.get_by_text("Tools")).first,
+                        timeout=10000,
+                    )
+                    # Heuristic: if there's a visible sign-in form, consider session invalid
+                    logged_in = not _sign_in_present(page)
             except Exception:
-                # non-fatal: continue without persisting
-                pass
+                # If any check fails, fall back to fresh login
+                logged_in = False
 
-        # ensure we have page/context to continue
-        if page is None:
-            page = context.new_page()
+        # If the session isn't valid, perform login and save storage
+        if not logged_in:
+            perform_login(context, page, iden_url, username, password)
 
         # 3) Navigate to challenge page (after authentication)
         try:
-            page.goto("https://hiring.idenhq.com/challenge", timeout=60000)
-            page.wait_for_load_state("networkidle", timeout=30000)
+            page.goto(CHALLENGE_URL, wait_until="domcontentloaded", timeout=60000)
         except Exception:
             # continue even if navigation has minor issues
             pass
+        # gate on the first control we need instead of waiting for the network to go idle;
+        # a sign-in form instead means the reused session was revoked server-side
+        # .first: another button whose name contains "Tools" would otherwise be a strict-mode
+        # violation and the wait would return at once
+        tools = page.get_by_role("button", name=_text_pattern("Tools")).first
+        wait_for_locator_visible(tools.or_(page.locator('input[type="password"]')).first, timeout=10000)
+        if logged_in and _sign_in_present(page):
+            perform_login(context, page, iden_url, username, password)
+            try:
+                page.goto(CHALLENGE_URL, wait_until="domcontentloaded", timeout=60000)
+            except Exception:
+                pass
+            wait_for_locator_visible(tools, timeout=10000)
 
         # 4) Interact: Tools > Open Data Tools > Open Inventory > Select Inventory Tab > Load Product Table
         # These are attempted by text; adjust if labels differ.
-        actions = [
-            "Tools",
-            "Open Data Tools",
-            "Open Inventory",
-            "Inventory",
-            "Load Product Table",
-            "Load Products",
-            "Load Product Table"
-        ]
-
+        # After each click wait for the control the next step needs instead of sleeping
         # Click Tools
         try_click_by_text(page, "Tools", timeout=5000)
-        time.sleep(1)
+        wait_for_text_visible(page, "Open Data Tools", timeout=5000)
 
         # Click Open Data Tools (try variations)
         try_click_by_text(page, "Open Data Tools", timeout=5000)
-        time.sleep(1)
+        wait_for_text_visible(page, "Inventory", timeout=5000)
 
         # Click Open Inventory (or Inventory)
+        inventory_clicked = False
         if not try_click_by_text(page, "Open Inventory", timeout=4000):
-            try_click_by_text(page, "Inventory", timeout=4000)
-        time.sleep(1)
+            inventory_clicked = try_click_by_text(page, "Inventory", timeout=4000)
+        wait_for_text_visible(page, "Inventory", timeout=5000)
+
+        # Ensure Inventory tab selected (skip when just clicked or already the active tab)
+        if not inventory_clicked:
+            try:
+                tab_selected = page.locator('[aria-selected="true"]:has-text("Inventory")').count() > 0
+            except Exception:
+                tab_selected = False
+            if not tab_selected:
+                try_click_by_text(page, "Inventory", timeout=4000)
+        wait_for_text_visible(page, "Load Product", timeout=5000)
 
-        # Ensure Inventory tab selected
-        try_click_by_text(page, "Inventory", timeout=4000)
-        time.sleep(1)
+        # capture the product data responses the table is built from
+        product_responses = []
+        page.on("response", lambda r: product_responses.append(r) if _is_product_response(r) else None)
 
         # Click Load Product Table (or similar)
         if not try_click_by_text(page, "Load Product Table", timeout=5000):
             try_click_by_text(page, "Load Products", timeout=5000)
-        time.sleep(2)
+        wait_for_locator_visible(page.locator("table, [data-test=product-card]").first, timeout=15000)
 
-        # 5) Wait for table or cards to appear and extract required fields
-        table_locator = None
-        try:
-            # try common selectors for table area
-            page.wait_for_selector("table", timeout=10000)
-            # prefer a table that contains the word "Product" in it
-            tables = page.locator("table")
-            chosen = None
-            for i in range(tables.count()):
-                t = tables.nth(i)
+        # 5) Prefer the product data the page fetched over scraping it back out of the DOM,
+        # unless it fell short of the total its endpoint advertised
+        api_products, api_total = collect_products_from_responses(page, product_responses)
+        final_products = api_products
+        if api_total and len(api_products) < api_total:
+            final_products = []
+
+        if not final_products:
+            # total advertised by the endpoint whose records were accepted (if any), so the
+            # DOM paths below can stop as soon as every row is in; responses rejected as
+            # non-product (stats, categories, ...) never supply it
+            expected_total = api_total
+            # otherwise wait for table or cards to appear and extract required fields
+            table_locator = None
+            try:
+                # try common selectors for table area
+                page.wait_for_selector("table", timeout=10000)
+                # prefer a table that contains the word "Product" in it; test every table
+                # in the page and get back just the index (first table if none match)
+                idx = page.evaluate(
+                    """hintSrc => {
+                        const hint = new RegExp(hintSrc, 'i');
+                        const ts = [...document.querySelectorAll('table')];
+                        for (let i = 0; i < ts.length; i++) {
+                            if (hint.test(ts[i].innerText.slice(0, 200))) return i;
+                        }
+                        return ts.length ? 0 : -1;
+                    }""",
+                    _TABLE_HINT_RE.pattern,
+                )
+                table_locator = page.locator("table").nth(idx) if idx >= 0 else None
+                # attempt to load all paginated pages and collect rows
                 try:
-                    txt = t.inner_text()[:200]
+                    collected = paginate_and_collect(page, table_locator, max_pages=None,
+                                                     expected_total=expected_total)
+                    if collected:
+                        # collected already normalized - use it as final_products
+                        final_products = collected
                 except Exception:
-                    txt = ""
-                if re.search(r"Prod(uct)?|SKU|Name|Price", txt, re.I):
-                    chosen = t
-                    break
-            if not chosen and tables.count() > 0:
-                chosen = tables.first
-            table_locator = chosen
-            # attempt to load all paginated pages and collect rows
-            try:
-                collected = paginate_and_collect(page, table_locator, max_pages=None)
-                if collected:
-                    # collected already normalized - use it as final_products
-                    final_products = collected
-            except Exception:
-                # fallback to single-page extraction below
-                pass
-        except PlaywrightTimeoutError:
-            # try to ensure all rows load (pagination / infinite scroll)
-            try:
-                ensure_all_rows_loaded(page, table_locator=table_locator, row_selector="tbody tr", timeout_ms=120000)
-            except Exception:
+                    # fallback to single-page extraction below
+                    pass
+            except PlaywrightTimeoutError:
+                # try to ensure all rows load (pagination / infinite scroll), stopping
+                # at the total the product API advertised
+                try:
+                    ensure_all_rows_loaded(page, table_locator=table_locator, row_selector="tbody tr",
+                                           timeout_ms=120000, expected_total=expected_total)
+                except Exception:
+                    pass
+            except PlaywrightTimeoutError:
                 pass
-        except PlaywrightTimeoutError:
-            pass
 
-        final_products = []
-
-        if not table_locator:
-            # look for product cards / containers containing the product text
-            # collect all text blocks that contain "SKU" or "Manufacturer" to build a blob
-            blocks = []
-            # try several selectors that might correspond to card containers
-            selectors = ["div", "section", "article"]
-            for sel in selectors:
-                elems = page.locator(sel).filter(has_text=re.compile(r"SKU|Manufacturer|ID:|Updated", re.I))
-                for i in range(elems.count()):
-                    txt = elems.nth(i).inner_text().strip()
-                    # skip very short irrelevant blocks
-                    if len(txt) > 40:
-                        blocks.append(txt)
-            # if nothing found, fallback to full page text
-            if not blocks:
-                page_text = page.inner_text("body")
-                blocks = [page_text]
-
-            blob = "\n\n".join(blocks)
-
-            # remove leading page header up to and including the known inventory header
-            header_re = re.compile(
-                r"Iden Challenge.*?Product Inventory\s*.*?Showing\s*\d+\s*of\s*\d+\s*products",
-                re.IGNORECASE | re.DOTALL,
-            )
-            m = header_re.search(blob)
-            if m:
-                blob = blob[m.end():].lstrip()
+            if not table_locator:
+                # look for product cards / containers containing the product text
+                # collect all text blocks that contain "SKU" or "Manufacturer" to build a blob
+                # one combined selector for the likely card containers; matching runs in the
+                # page so all blocks come back in one round-trip
+                try:
+                    blocks = page.evaluate(
+                        """hintSrc => {
+                            const hint = new RegExp(hintSrc, 'i');
+                            const out = [];
+                            for (const el of document.querySelectorAll('div, section, article')) {
+                                // cheap textContent test first; innerText (which needs layout)
+                                // only for candidates
+                                if (!hint.test(el.textContent || '')) continue;
+                                const t = (el.innerText || '').trim();
+                                // skip very short irrelevant blocks
+                                if (t.length > 40 && hint.test(t)) out.push(t);
+                            }
+                            return out;
+                        }""",
+                        _BLOCK_HINT_RE.pattern,
+                    )
+                except Exception:
+                    blocks = []
+                # if nothing found, fallback to full page text
+                if not blocks:
+                    # read the text directly; innerText keeps the line breaks the card parser relies on
+                    page_text = page.evaluate("() => document.body.innerText || document.body.textContent")
+                    blocks = [page_text]
+
+                blob = "\n\n".join(blocks)
+
+                # remove leading page header up to and including the known inventory header
+                header_end = _header_end(blob)
+                if header_end is not None:
+                    blob = blob[header_end:].lstrip()
+
+                # cards come back deduped, with only the requested fields in the required order
+                final_products = parse_products_from_text(blob)
+            else:
+                # if paginate_and_collect already filled final_products, skip
+                if not final_products:
+                    # table exists: extract only the output columns, already normalized (single page)
+                    try:
+                        final_products = extract_products_from_table(table_locator)
+                    except Exception:
+                        # e.g. the page navigated away; keep whatever was collected
+                        final_products = []
 
-            parsed = parse_products_from_text(blob)
-            # keep only requested fields in the required order
-            required = ["product_name", "type", "id", "shade", "cost", "manufacturer", "sku", "composition", "updated"]
-            final_products = []
-            for p in parsed:
-                out = {}
-                for k in required:
-                    v = p.get(k, "")
-                    if k == "id" and str(v).isdigit():
-                        v = int(v)
-                    out[k] = v
-                final_products.append(out)
-        else:
-            # if paginate_and_collect already filled final_products, skip
-            if not final_products:
-                # table exists: extract rows & normalize (single page)
-                products = extract_table_to_list(table_locator)
-                normalized = []
-                for r in products:
-                    nr = normalize_row_dict(r)
-                    normalized.append(nr)
-                final_products = normalized
+            # keep the (partial) API result if the DOM paths recovered less
+            if len(api_products) > len(final_products):
+                final_products = api_products
 
         # Ensure final_products contains only requested fields and pretty-print
         # Convert any non-serializable values (e.g., ints) are okay for json
-        OUTPUT_PATH.write_text(json.dumps(final_products, indent=2))
+        _dump_json(final_products, OUTPUT_PATH)
 
         context.close()
-        browser.close()
 
 
 def merge_and_persist_storage_state(context, path=STORAGE_STATE):
@@ -692,7 +1127,7 @@ def merge_and_persist_storage_state(context, path=STORAGE_STATE):
         # load existing file if present
         if path.exists():
             try:
-                existing = json.loads(path.read_text())
+                existing = _load_json(path)
             except Exception:
                 existing = {}
         else:
@@ -715,7 +1150,7 @@ def merge_and_persist_storage_state(context, path=STORAGE_STATE):
         merged_origins = list(merged_origin_map.values())
 
         merged = {"cookies": merged_cookies, "origins": merged_origins}
-        path.write_text(json.dumps(merged, indent=2))
+        _dump_json(merged, path)
     except Exception as e:
         # non-fatal: print warning so runs continue
         print("Warning: could not persist merged storage state:", str(e))